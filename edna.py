@@ -1,10 +1,21 @@
 import tkinter as tk
 from tkinter import messagebox, filedialog, ttk, PhotoImage
 import tkintermapview
+import numpy as np
 import pandas as pd
 import threading
+import hashlib
+import os
+from pathlib import Path
 from PIL import Image, ImageTk
 
+# Parquet copies of previously opened data files, one per source path, named <md5(path)>-<mtime_ns>.parquet
+CACHE_DIR = Path('~/.edna_cache').expanduser()
+# Upper bound on markers drawn at once; tkintermapview slows to a crawl well before 10k pins
+MAX_MARKERS = 2000
+# Screen size (px) of the grid cells used to thin dense marker sets, one marker per cell
+LOD_CELL_PX = 24
+
 class EdnaApp(tk.Tk):
     """
     An advanced eDNA Data Management and Visualization application with a professional,
@@ -18,6 +29,14 @@ class EdnaApp(tk.Tk):
 
         self.data = None
         self.markers = []
+        self._last_filter_signature = None
+        self._plot_data = None
+        self._pending_lod = None
+        self._lod_view = None
+        # Serializes marker redraws from filter, clear and pan/zoom threads
+        self._draw_lock = threading.RLock()
+        self._species_index = {}
+        self._pending_filter = None
 
         # --- Initialize the Animated Login Screen ---
         self.init_animated_login_screen()
@@ -179,27 +198,81 @@ class EdnaApp(tk.Tk):
         self.map_widget.set_tile_server("https://mt0.google.com/vt/lyrs=m&hl=en&x={x}&y={y}&z={z}&s=Ga", max_zoom=22)
         self.map_widget.set_position(20.5937, 78.9629)
         self.map_widget.set_zoom(5)
+        # tkintermapview has no view-change callback, so watch the pan/zoom input events instead
+        for sequence in ('<ButtonRelease-1>', '<MouseWheel>', '<Button-4>', '<Button-5>'):
+            self.map_widget.canvas.bind(sequence, self._on_map_view_changed, add='+')
 
     def open_file(self):
         filepath = filedialog.askopenfilename(filetypes=[('Excel files', '*.xlsx *.xls'), ('CSV files', '*.csv')])
         if filepath:
+            threading.Thread(target=self._load_file, args=(filepath,), daemon=True).start()
+
+    def _load_file(self, filepath):
+        """Reads the data file off the UI thread and hands the result back via after()."""
+        try:
+            data = self._read_data_file(filepath)
+            species_index = self._build_species_index(data)
+        except Exception as e:
+            self.after(0, messagebox.showerror, 'Error', f'Failed to load file: {e}')
+            return
+        self.after(0, self._on_file_loaded, filepath, data, species_index)
+
+    def _read_data_file(self, filepath):
+        """Returns the parsed data, reusing a cached Parquet copy when the source is unchanged."""
+        stem = hashlib.md5(os.path.abspath(filepath).encode()).hexdigest()
+        cache_path = CACHE_DIR / f'{stem}-{os.stat(filepath).st_mtime_ns}.parquet'
+        if cache_path.exists():
             try:
-                self.data = pd.read_excel(filepath) if filepath.endswith(('.xlsx', '.xls')) else pd.read_csv(filepath)
-                messagebox.showinfo('File Loaded', f'Successfully loaded: {filepath}')
-                self.populate_filters()
-                threading.Thread(target=self.draw_map_markers, daemon=True).start()
-            except Exception as e:
-                messagebox.showerror('Error', f'Failed to load file: {e}')
+                return pd.read_parquet(cache_path)
+            except Exception:
+                pass  # Unreadable cache entry; fall back to the source file
+        data = pd.read_excel(filepath) if filepath.endswith(('.xlsx', '.xls')) else pd.read_csv(filepath)
+        if 'SamplingDate' in data:
+            data['SamplingDate'] = pd.to_datetime(data['SamplingDate'], errors='coerce')
+        tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+        try:
+            CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            # Write under a temp name so a failed write never leaves a truncated entry in place
+            data.to_parquet(tmp_path)
+            os.replace(tmp_path, cache_path)
+            # Drop copies made from earlier versions of the same file
+            for stale in CACHE_DIR.glob(f'{stem}-*.parquet'):
+                if stale != cache_path: stale.unlink(missing_ok=True)
+        except Exception:
+            # No Parquet engine installed or cache dir not writable; caching is best effort
+            try: tmp_path.unlink(missing_ok=True)
+            except OSError: pass
+        return data
+
+    def _on_file_loaded(self, filepath, data, species_index):
+        try:
+            # Swap data and its index together so filters never see row positions from another file
+            self.data, self._species_index = data, species_index
+            messagebox.showinfo('File Loaded', f'Successfully loaded: {filepath}')
+            self.populate_filters()
+            threading.Thread(target=self.draw_map_markers, daemon=True).start()
+        except Exception as e:
+            messagebox.showerror('Error', f'Failed to load file: {e}')
 
     def populate_filters(self):
         if self.data is None: return
-        species = sorted(set(s.strip() for sl in self.data['SpeciesDetected'].dropna() for s in sl.split(',')))
-        self.species_entry['values'] = species
+        # The species index is built from the same comma split, so its keys are the distinct names
+        self.species_entry['values'] = sorted(self._species_index)
         self.waterbody_entry['values'] = sorted(self.data['WaterBodyType'].dropna().unique())
 
+    @staticmethod
+    def _build_species_index(data):
+        """Maps each species name to the row positions whose SpeciesDetected list contains it."""
+        species = pd.Series(data['SpeciesDetected'].to_numpy(), dtype=object).str.split(',').explode().str.strip().dropna()
+        return {name: rows.to_numpy() for name, rows in species.groupby(species).groups.items()}
+
     def clear_filters(self):
         self.species_var.set(""); self.waterbody_var.set("")
         self.date_from_entry.delete(0, 'end'); self.date_to_entry.delete(0, 'end')
+        if self._pending_filter:
+            self.after_cancel(self._pending_filter)
+            self._pending_filter = None
+        self._cancel_pending_lod()
         if self.data is not None:
             threading.Thread(target=self.draw_map_markers, daemon=True).start()
 
@@ -207,29 +280,107 @@ class EdnaApp(tk.Tk):
         if self.data is None:
             messagebox.showwarning('No Data', 'Please load a data file first.')
             return
+        # Coalesce a burst of clicks into a single filter run once input settles
+        if self._pending_filter: self.after_cancel(self._pending_filter)
+        self._pending_filter = self.after(150, self._start_filter)
+
+    def _start_filter(self):
+        self._pending_filter = None
+        self._cancel_pending_lod()
         threading.Thread(target=self._filter_and_draw, daemon=True).start()
 
     def _filter_and_draw(self):
-        filtered_data = self.data.copy()
-        if self.species_var.get(): filtered_data = filtered_data[filtered_data['SpeciesDetected'].str.contains(self.species_var.get(), na=False)]
-        if self.waterbody_var.get(): filtered_data = filtered_data[filtered_data['WaterBodyType'] == self.waterbody_var.get()]
-        if self.date_from_entry.get(): filtered_data = filtered_data[pd.to_datetime(filtered_data['SamplingDate']) >= pd.to_datetime(self.date_from_entry.get())]
-        if self.date_to_entry.get(): filtered_data = filtered_data[pd.to_datetime(filtered_data['SamplingDate']) <= pd.to_datetime(self.date_to_entry.get())]
-        self.draw_map_markers(filtered_data)
+        # Re-applying the same filters to the same data would redraw identical markers
+        signature = (id(self.data), self.species_var.get(), self.waterbody_var.get(),
+                     self.date_from_entry.get(), self.date_to_entry.get())
+        if signature == self._last_filter_signature: return
+        # Build one boolean mask over plain arrays and index once, avoiding per-step index alignment
+        mask = np.ones(len(self.data), dtype=bool)
+        if self.species_var.get():
+            # Exact lookup in the prebuilt index; no per-row substring scan or partial-name matches
+            species_mask = np.zeros(len(self.data), dtype=bool)
+            species_mask[self._species_index.get(self.species_var.get().strip(), np.empty(0, dtype=int))] = True
+            mask &= species_mask
+        if self.waterbody_var.get(): mask &= (self.data['WaterBodyType'] == self.waterbody_var.get()).to_numpy()
+        if self.date_from_entry.get(): mask &= (self.data['SamplingDate'] >= pd.to_datetime(self.date_from_entry.get())).to_numpy()
+        if self.date_to_entry.get(): mask &= (self.data['SamplingDate'] <= pd.to_datetime(self.date_to_entry.get())).to_numpy()
+        with self._draw_lock:
+            self.draw_map_markers(self.data[mask])
+            # The signature describes what is on the map, so it only changes with the draw lock held;
+            # storing it after the draw also lets a failed run be retried as-is
+            self._last_filter_signature = signature
 
     def draw_map_markers(self, data_to_plot=None):
+        unfiltered = data_to_plot is None
         if data_to_plot is None: data_to_plot = self.data
         if data_to_plot is None: return
-        for marker in self.markers: marker.delete()
-        self.markers.clear()
-        for _, row in data_to_plot.iterrows():
-            text = f"SampleID: {row['SampleID']}\nSpecies: {row['SpeciesDetected']}"
-            marker = self.map_widget.set_marker(row['Latitude'], row['Longitude'], text=text)
-            self.markers.append(marker)
+        with self._draw_lock:
+            if unfiltered: self._last_filter_signature = None
+            self._plot_data = data_to_plot
+            # Every marker canvas item carries the "marker" tag, so one delete clears them all;
+            # delete_all_marker() would still remove them one by one
+            self.map_widget.canvas.delete("marker")
+            self.map_widget.canvas_marker_list = []
+            self.markers.clear()
+            # Remember the view a thinned draw was computed for, so an unchanged view can skip redrawing
+            self._lod_view = ((self.map_widget.get_position(), self.map_widget.zoom)
+                              if len(data_to_plot) > MAX_MARKERS else None)
+            data_to_plot = self._level_of_detail(data_to_plot)
+            # Build every marker label in one vectorized pass, then walk plain column arrays
+            texts = ("SampleID: " + data_to_plot['SampleID'].astype(str)
+                     + "\nSpecies: " + data_to_plot['SpeciesDetected'].astype(str))
+            rows = zip(data_to_plot['Latitude'].to_numpy(), data_to_plot['Longitude'].to_numpy(), texts.to_numpy())
+            for lat, lon, text in rows:
+                marker = self.map_widget.set_marker(lat, lon, text=text)
+                self.markers.append(marker)
+
+    def _level_of_detail(self, data):
+        """Limits dense data to the visible area, then to one sample per screen grid cell."""
+        if len(data) <= MAX_MARKERS: return data
+        north, west = self.map_widget.convert_canvas_coords_to_decimal_coords(0, 0)
+        south, east = self.map_widget.convert_canvas_coords_to_decimal_coords(
+            self.map_widget.winfo_width(), self.map_widget.winfo_height())
+        lats, lons = data['Latitude'].to_numpy(), data['Longitude'].to_numpy()
+        data = data[(lats >= south) & (lats <= north) & (lons >= west) & (lons <= east)]
+        if len(data) <= MAX_MARKERS: return data
+        cell_deg = LOD_CELL_PX * 360 / (256 * 2 ** round(self.map_widget.zoom))
+        cells = pd.DataFrame({'x': np.floor(data['Longitude'].to_numpy() / cell_deg),
+                              'y': np.floor(data['Latitude'].to_numpy() / cell_deg)})
+        data = data[~cells.duplicated().to_numpy()]
+        if len(data) > MAX_MARKERS: data = data.sample(MAX_MARKERS, random_state=0)
+        return data
+
+    def _on_map_view_changed(self, event=None):
+        """Re-thins the markers once panning or zooming settles, if the data needed thinning."""
+        if self._plot_data is None or len(self._plot_data) <= MAX_MARKERS: return
+        self._cancel_pending_lod()
+        self._pending_lod = self.after(200, self._redraw_visible_markers)
+
+    def _cancel_pending_lod(self):
+        if self._pending_lod:
+            self.after_cancel(self._pending_lod)
+            self._pending_lod = None
+
+    def _redraw_visible_markers(self, last_view=None):
+        # Releasing a drag starts an inertial coast, so poll until the view has stopped moving
+        view = (self.map_widget.get_position(), self.map_widget.zoom)
+        if view != last_view:
+            self._pending_lod = self.after(100, self._redraw_visible_markers, view)
+            return
+        self._pending_lod = None
+        # A plain click (e.g. on a marker) also ends in a release; nothing to do if the view never changed
+        if view == self._lod_view: return
+        threading.Thread(target=self._redraw_current_markers, daemon=True).start()
+
+    def _redraw_current_markers(self):
+        # Read _plot_data under the lock so a concurrent filter's newer data is never overwritten
+        with self._draw_lock:
+            self.draw_map_markers(self._plot_data)
 
 
 if __name__ == '__main__':
     # Dependencies: pip install pandas openpyxl tkintermapview pillow
+    # Optional: pip install pyarrow (enables the Parquet cache for reopened files)
     app = EdnaApp()
     app.mainloop()
 